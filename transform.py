@@ -0,0 +1,45 @@
+"""书籍数据转换模块。
+
+独立成模块并带完整类型注解，方便用 mypyc 编译成C扩展
+（`pip install mypy && mypyc transform.py`），对万级书单可提速数倍；
+不编译时作为纯Python模块正常工作，调用方无需改动。
+"""
+import logging
+from datetime import datetime
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+# 微信读书 markedStatus → 阅读状态映射，新增状态时在这里补充即可
+_STATUS: Dict[int, str] = {1: "在读", 4: "读完"}
+
+def transform_book_data(book: Dict[str, Any]) -> Dict[str, Any]:
+    """将微信读书数据转换为飞书表格格式"""
+    book_info: Dict[str, Any] = book.get("book") or {}
+    # 绑定为局部变量，避免每次字段取值都做一遍方法查找
+    get = book_info.get
+
+    # 先收窄到int，保证_STATUS的键类型在mypyc下能通过检查
+    status = get("markedStatus")
+
+    # 根据你的飞书表格字段名进行映射
+    fields: Dict[str, Any] = {
+        "书名": get("title", "未知书名"),
+        "作者": get("author", "未知作者"),
+        "阅读进度": get("readingProgress", 0) or 0,
+        "阅读状态": _STATUS.get(status, "在读") if isinstance(status, int) else "在读"
+    }
+
+    # 处理封面
+    cover_url = get("cover", "")
+    if cover_url and cover_url.startswith("http"):
+        fields["封面"] = [{"type": "url", "text": cover_url}]
+
+    # 处理完成日期：先校验类型，isoformat比strftime省去locale处理
+    finish_time = get("finishReadingTime")
+    if isinstance(finish_time, (int, float)) and finish_time > 0:
+        fields["完成阅读日期"] = datetime.fromtimestamp(finish_time).date().isoformat()
+
+    # 用%s占位而非f-string，DEBUG未开启时跳过字符串插值
+    logger.debug("📖 处理书籍: %s", fields["书名"])
+    return fields
@@ -1,9 +1,14 @@
 import os
-import requests
+import asyncio
+import httpx
+import ijson
 import json
+import orjson
 import logging
-from datetime import datetime
+import time
+from aiolimiter import AsyncLimiter
 from dotenv import load_dotenv
+from transform import transform_book_data
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -28,104 +33,185 @@ FEISHU_BITABLE_RECORDS_URL = f"{FEISHU_API_BASE}/bitable/v1/apps/{FEISHU_APP_TOK
 
 WEREAD_NOTEBOOK_URL = "https://i.weread.qq.com/user/notebooks"
 
-def get_feishu_access_token():
-    """获取飞书访问令牌"""
-    headers = {"Content-Type": "application/json"}
-    data = {
-        "app_id": FEISHU_APP_ID,
-        "app_secret": FEISHU_APP_SECRET
-    }
-    
-    try:
-        response = requests.post(FEISHU_GET_TOKEN_URL, headers=headers, json=data, timeout=10)
-        response.raise_for_status()
-        result = response.json()
-        
-        if result.get("code") == 0:
-            logger.info("✅ 成功获取飞书访问令牌")
-            return result.get("tenant_access_token")
-        else:
-            logger.error(f"❌ 获取飞书令牌失败: {result.get('msg')}")
-            return None
-    except Exception as e:
-        logger.error(f"❌ 请求飞书API失败: {str(e)}")
-        return None
+# 每次 batch_create 最多提交的记录数（飞书接口上限为500）
+FEISHU_BATCH_SIZE = 500
+# 令牌桶限速：按飞书公开的QPS上限放行请求，而不是固定sleep
+FEISHU_RATE_LIMIT_QPS = 20
+# 遇到限流时的最大重试次数
+FEISHU_MAX_RETRIES = 3
 
-def get_weread_books():
-    """获取微信读书笔记本数据"""
-    headers = {
-        "Cookie": WEREAD_COOKIE,
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-    }
-    
-    try:
-        response = requests.get(WEREAD_NOTEBOOK_URL, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        
-        books = data.get("books", [])
-        logger.info(f"📚 从微信读书获取到 {len(books)} 本书")
-        return books
-    except Exception as e:
-        logger.error(f"❌ 获取微信读书数据失败: {str(e)}")
-        return []
-
-def transform_book_data(book):
-    """将微信读书数据转换为飞书表格格式"""
-    book_info = book.get("book", {})
-    
-    # 根据你的飞书表格字段名进行映射
-    fields = {
-        "书名": book_info.get("title", "未知书名"),
-        "作者": book_info.get("author", "未知作者"),
-        "阅读进度": book_info.get("readingProgress", 0) or 0,
-        "阅读状态": "读完" if book_info.get("markedStatus") == 4 else "在读"
-    }
-    
-    # 处理封面
-    cover_url = book_info.get("cover", "")
-    if cover_url and cover_url.startswith("http"):
-        fields["封面"] = [{"type": "url", "text": cover_url}]
-    
-    # 处理完成日期
-    finish_time = book_info.get("finishReadingTime")
-    if finish_time:
+# 飞书令牌本地缓存文件（令牌约2小时有效，缓存后无需每次运行都重新获取）
+FEISHU_TOKEN_CACHE_FILE = os.path.expanduser("~/.feishu_token_cache.json")
+
+def build_http_client():
+    """构建全局共享的异步HTTP客户端：HTTP/2复用连接，连接错误在传输层重试"""
+    # 注意：传入自定义transport后，客户端层的http2/limits参数会被忽略，必须配在transport上
+    return httpx.AsyncClient(
+        timeout=10,
+        transport=httpx.AsyncHTTPTransport(
+            http2=True,
+            retries=3,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+        ),
+        headers={
+            # 显式请求压缩响应，大体积JSON（微信读书书单）可减少数倍传输量
+            "Accept-Encoding": "gzip, deflate, br"
+        }
+    )
+
+class FeishuClient:
+    """飞书开放平台客户端：鉴权（带本地缓存）+ 多维表格批量写入"""
+
+    def __init__(self):
+        self.batch_create_url = f"{FEISHU_BITABLE_RECORDS_URL}/batch_create"
+
+    def _load_cached_token(self):
+        """从本地缓存读取未过期的飞书令牌，没有则返回None"""
         try:
-            # 将时间戳转换为飞书支持的日期格式
-            finish_date = datetime.fromtimestamp(finish_time).strftime("%Y-%m-%d")
-            fields["完成阅读日期"] = finish_date
-        except:
+            with open(FEISHU_TOKEN_CACHE_FILE, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+            if cache.get("expires_at", 0) > time.time():
+                return cache.get("token")
+        except (OSError, ValueError):
             pass
-    
-    logger.info(f"📖 处理书籍: {fields['书名']}")
-    return fields
-
-def add_record_to_feishu(record_data, access_token):
-    """添加单条记录到飞书表格"""
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
-    
-    data = {
-        "fields": record_data
-    }
-    
-    try:
-        response = requests.post(FEISHU_BITABLE_RECORDS_URL, headers=headers, json=data, timeout=10)
-        result = response.json()
-        
-        if result.get("code") == 0:
-            logger.info(f"✅ 成功添加记录: {record_data.get('书名', '未知')}")
-            return True
-        else:
-            logger.error(f"❌ 添加记录失败: {result.get('msg')}")
-            return False
-    except Exception as e:
-        logger.error(f"❌ 请求飞书表格API失败: {str(e)}")
-        return False
-
-def main():
+        return None
+
+    def _save_cached_token(self, token, expire):
+        """将飞书令牌写入本地缓存，提前60秒过期留出余量"""
+        cache = {
+            "token": token,
+            "expires_at": time.time() + expire - 60
+        }
+        # 先写临时文件再原子替换，避免并发运行时读到写了一半的缓存
+        tmp_file = FEISHU_TOKEN_CACHE_FILE + ".tmp"
+        try:
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(cache, f)
+            os.replace(tmp_file, FEISHU_TOKEN_CACHE_FILE)
+        except OSError as e:
+            logger.warning(f"⚠️ 写入令牌缓存失败: {str(e)}")
+
+    async def get_access_token(self, client):
+        """获取飞书访问令牌，优先使用本地缓存"""
+        cached_token = self._load_cached_token()
+        if cached_token:
+            logger.info("✅ 使用缓存的飞书访问令牌")
+            return cached_token
+
+        data = {
+            "app_id": FEISHU_APP_ID,
+            "app_secret": FEISHU_APP_SECRET
+        }
+
+        try:
+            response = await client.post(
+                FEISHU_GET_TOKEN_URL,
+                content=orjson.dumps(data),
+                headers={"Content-Type": "application/json"}
+            )
+            response.raise_for_status()
+            result = orjson.loads(response.content)
+
+            if result.get("code") == 0:
+                logger.info("✅ 成功获取飞书访问令牌")
+                token = result.get("tenant_access_token")
+                self._save_cached_token(token, result.get("expire", 0))
+                return token
+            else:
+                logger.error(f"❌ 获取飞书令牌失败: {result.get('msg')}")
+                return None
+        except (httpx.HTTPError, ValueError) as e:
+            logger.error(f"❌ 请求飞书API失败: {str(e)}")
+            return None
+
+    async def _post_batch(self, client, batch, headers, limiter):
+        """提交一个批次到飞书表格，返回成功写入的记录数"""
+        data = {
+            "records": [{"fields": fields} for fields in batch]
+        }
+
+        try:
+            for attempt in range(FEISHU_MAX_RETRIES + 1):
+                async with limiter:
+                    response = await client.post(
+                        self.batch_create_url,
+                        content=orjson.dumps(data),
+                        headers=headers
+                    )
+                # 被限流时优先按服务端Retry-After等待后重试，正常情况下不等待
+                if response.status_code == 429 and attempt < FEISHU_MAX_RETRIES:
+                    retry_after = response.headers.get("Retry-After") or response.headers.get("X-Ogw-Ratelimit-Reset")
+                    try:
+                        delay = float(retry_after)
+                    except (TypeError, ValueError):
+                        delay = 2 ** attempt
+                    await asyncio.sleep(delay)
+                    continue
+                result = orjson.loads(response.content)
+                break
+
+            if result.get("code") == 0:
+                logger.info(f"✅ 成功批量添加 {len(batch)} 条记录")
+                return len(batch)
+            else:
+                logger.error(f"❌ 批量添加记录失败: {result.get('msg')}")
+                return 0
+        except (httpx.HTTPError, ValueError) as e:
+            logger.error(f"❌ 请求飞书表格API失败: {str(e)}")
+            return 0
+
+    async def batch_create(self, client, access_token, fields_list, batch_size=FEISHU_BATCH_SIZE):
+        """并发批量添加记录到飞书表格，返回成功写入的记录数"""
+        batches = [
+            fields_list[start:start + batch_size]
+            for start in range(0, len(fields_list), batch_size)
+        ]
+
+        headers = {
+            "Authorization": f"Bearer {access_token}",
+            "Content-Type": "application/json"
+        }
+        # HTTP/2下多个在途批次复用同一条TLS连接，令牌桶按真实QPS上限放行
+        limiter = AsyncLimiter(max_rate=FEISHU_RATE_LIMIT_QPS, time_period=1)
+        results = await asyncio.gather(
+            *[self._post_batch(client, batch, headers, limiter) for batch in batches]
+        )
+        return sum(results)
+
+@ijson.coroutine
+def _collect_items(items):
+    """ijson推送式解析的接收端，把解析出的对象追加到items"""
+    while True:
+        items.append((yield))
+
+class WeReadClient:
+    """微信读书客户端：拉取笔记本书单"""
+
+    def __init__(self):
+        self.headers = {
+            "Cookie": WEREAD_COOKIE,
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+        }
+
+    async def get_books(self, client):
+        """流式获取微信读书笔记本数据，边下载边解析"""
+        books = []
+        try:
+            async with client.stream("GET", WEREAD_NOTEBOOK_URL, headers=self.headers) as response:
+                response.raise_for_status()
+                # 响应字节一到就喂给增量解析器，不必等完整payload落地再解析
+                parser = ijson.items_coro(_collect_items(books), "books.item")
+                async for chunk in response.aiter_bytes():
+                    parser.send(chunk)
+                parser.close()
+
+            logger.info(f"📚 从微信读书获取到 {len(books)} 本书")
+            return books
+        except (httpx.HTTPError, ijson.JSONError) as e:
+            logger.error(f"❌ 获取微信读书数据失败: {str(e)}")
+            return []
+
+async def main():
     """主函数"""
     logger.info("🎬 开始同步流程...")
     
@@ -145,34 +231,29 @@ def main():
     
     logger.info("✅ 所有环境变量检查通过")
     
-    # 1. 获取飞书访问令牌
-    access_token = get_feishu_access_token()
-    if not access_token:
-        return
-    
-    # 2. 获取微信读书数据
-    books = get_weread_books()
-    if not books:
-        logger.info("📭 没有获取到书籍数据，同步结束")
-        return
-    
-    # 3. 处理并同步每本书
-    success_count = 0
-    for book in books:
-        try:
-            # 转换数据格式
-            record_data = transform_book_data(book)
-            
-            # 添加到飞书表格
-            if add_record_to_feishu(record_data, access_token):
-                success_count += 1
-                
-        except Exception as e:
-            book_title = book.get("book", {}).get("title", "未知书籍")
-            logger.error(f"❌ 处理书籍 {book_title} 时出错: {str(e)}")
-            continue
-    
+    feishu = FeishuClient()
+    weread = WeReadClient()
+
+    async with build_http_client() as client:
+        # 1. 两个独立的网络调用并发执行，重叠各自的往返延迟
+        access_token, books = await asyncio.gather(
+            feishu.get_access_token(client),
+            weread.get_books(client)
+        )
+        if not access_token:
+            return
+        if not books:
+            logger.info("📭 没有获取到书籍数据，同步结束")
+            return
+
+        # 2. 转换数据格式
+        records = [transform_book_data(book) for book in books]
+        logger.info("📖 已转换 %d 本书", len(records))
+
+        # 3. 批量写入飞书表格
+        success_count = await feishu.batch_create(client, access_token, records)
+
     logger.info(f"🎉 同步完成! 成功处理 {success_count}/{len(books)} 本书")
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())